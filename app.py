@@ -9,7 +9,9 @@ which demonstrates a meta-level framework for enhancing AI conversations.
 import os
 import sys
 import argparse
+import functools
 import logging
+import shutil
 from pathlib import Path
 
 # Configure logging
@@ -23,22 +25,31 @@ logging.basicConfig(
 
 logger = logging.getLogger("metachat")
 
+# Application directory and environment state, resolved once at import
+_HERE = Path(__file__).resolve().parent
+_HAS_API_KEY = "OPENAI_API_KEY" in os.environ
+
 def setup_environment():
     """Set up the application environment."""
     # Create data directory if it doesn't exist
-    data_dir = Path(os.path.dirname(os.path.abspath(__file__))) / "data"
-    data_dir.mkdir(exist_ok=True)
+    data_dir = _HERE / "data"
+    if not data_dir.exists():
+        data_dir.mkdir(exist_ok=True)
     
     # Check for OpenAI API key
-    if "OPENAI_API_KEY" not in os.environ:
+    if not _HAS_API_KEY:
         logger.warning("OPENAI_API_KEY environment variable is not set. You'll need to provide it in the application.")
 
+@functools.lru_cache(maxsize=1)
+def _streamlit_cmd():
+    """Locate the streamlit executable on PATH, once per process."""
+    return shutil.which("streamlit")
+
 def run_streamlit():
-    """Run the Streamlit application."""
-    import subprocess
-    import shutil
+    """Run the Streamlit application, replacing the current process."""
+    import importlib.util
     
-    streamlit_path = Path(os.path.dirname(os.path.abspath(__file__))) / "ui" / "streamlit_app.py"
+    streamlit_path = _HERE / "ui" / "streamlit_app.py"
     
     if not streamlit_path.exists():
         logger.error(f"Streamlit application not found at {streamlit_path}")
@@ -47,29 +58,30 @@ def run_streamlit():
     logger.info(f"Starting Streamlit application from {streamlit_path}")
     
     # Try to find streamlit executable
-    streamlit_cmd = shutil.which("streamlit")
+    streamlit_cmd = _streamlit_cmd()
     
     if streamlit_cmd:
         # Use the found streamlit command
         try:
-            subprocess.run([streamlit_cmd, "run", str(streamlit_path)], check=True)
-        except subprocess.CalledProcessError as e:
+            # Flush log output before the process image is replaced
+            sys.stdout.flush()
+            os.execvp(streamlit_cmd, [streamlit_cmd, "run", str(streamlit_path)])
+        except OSError as e:
             logger.error(f"Error running Streamlit: {e}")
             sys.exit(1)
     else:
         # Fallback: Try to run streamlit via python module
         logger.info("Streamlit command not found in PATH, trying to run via python -m streamlit")
         try:
-            subprocess.run([sys.executable, "-m", "streamlit", "run", str(streamlit_path)], check=True)
-        except subprocess.CalledProcessError as e:
+            if importlib.util.find_spec("streamlit") is None:
+                raise OSError("streamlit module not found")
+            sys.stdout.flush()
+            os.execvp(sys.executable, [sys.executable, "-m", "streamlit", "run", str(streamlit_path)])
+        except OSError as e:
             logger.error(f"Error running Streamlit via python module: {e}")
             logger.error("Please ensure Streamlit is installed by running: pip install streamlit")
             logger.info("Alternatively, you can run the application directly with: streamlit run ui/streamlit_app.py")
             sys.exit(1)
-        except FileNotFoundError:
-            logger.error("Failed to launch Streamlit. Please ensure it's installed with: pip install streamlit")
-            logger.info("Then run directly with: streamlit run ui/streamlit_app.py")
-            sys.exit(1)
 
 def run_cli():
     """Run the command-line interface."""
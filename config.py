@@ -5,13 +5,15 @@ MetaChat Configuration
 This module provides configuration settings for the MetaChat framework.
 """
 
-import os
-from typing import Dict, List, Any
+from pathlib import Path
+
+# Directory containing this file, resolved once at import
+_HERE = Path(__file__).resolve().parent
 
 # Database configuration
 DB_CONFIG = {
     "db_name": "metachat_db",
-    "db_path": os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+    "db_path": str(_HERE / "data")
 }
 
 # Default role mappings
@@ -80,7 +82,10 @@ SYSTEM_PROMPTS = [
 OPENAI_CONFIG = {
     "default_model": "gpt-4o",
     "temperature": 0.7,
-    "max_tokens": 1000
+    "max_tokens": 1000,
+    # Get the manager advice and the enhanced response from a single request
+    # instead of two sequential ones (responses are then not streamed)
+    "fused_advice_and_response": False
 }
 
 # UI Configuration
@@ -6,48 +6,100 @@ This module provides the core functionality for the MetaChat framework,
 which enables meta-level analysis and improvement of AI conversations.
 """
 
-import os
+from __future__ import annotations
+
+import re
+import sys
 import asyncio
-from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from collections.abc import AsyncIterator
+from typing import Any
+
+from config import SYSTEM_PROMPTS
 
 # Import utility modules
-from utils.chat_utils import fetch_chat, add_message, parse_chat
-from utils.openai_utils import generate_text, generate_json_custom_ai, add_messages
+from utils.chat_utils import fetch_chat, add_message, format_messages, MESSAGE_SEPARATOR
+from utils.import_utils import lazy_import
+
+# The OpenAI SDK is only imported once the first completion is requested
+openai_utils = lazy_import("utils.openai_utils")
+
+# Maximum number of chats whose formatted transcripts are cached
+_CHAT_CACHE_SIZE = 32
+
+# Prompt templates, filled in with str.format on every turn
+_MANAGER_PROMPT = (
+    "The current conversation between the sales assistant and inquirer is as follows:\n\n"
+    "{chat}\n\n"
+    "Provide specific advice to help the sales assistant better handle this conversation."
+)
+
+_ENHANCED_PROMPT = """You have received the following advice from your Sales Manager:
+
+"{advice}"
+
+Here is the current chat:
+{chat}
+
+The customer's last message was:
+"{msg}"
+
+Please respond to the customer's last message, applying the advice from your sales manager.
+"""
+
+_FUSED_SYSTEM_PROMPT = """{manager}
+
+First, write your advice to the sales assistant inside <advice></advice> tags.
+
+Then take on the following role and apply that advice:
+{assistant}
+
+Write your reply to the customer's last message inside <response></response> tags."""
+
+_FUSED_PROMPT = """Here is the current chat:
+{chat}
+
+The customer's last message was:
+"{msg}"
+"""
+
+# Pieces of a fused completion: the manager advice block (which may be left unclosed),
+# the assistant response block, and any stray tag markers
+_FUSED_ADVICE_RE = re.compile(r"<advice>(.*?)(?:</advice>|(?=<response>)|$)", re.S | re.I)
+_FUSED_RESPONSE_RE = re.compile(r"<response>(.*?)(?:</response>|$)", re.S | re.I)
+_FUSED_TAG_RE = re.compile(r"</?(?:advice|response)>", re.I)
 
 class MetaChat:
     """
     MetaChat framework for meta-level conversation processing and enhancement.
     """
     
-    def __init__(self, db_name: str = "metachat_db"):
+    def __init__(self, db_name: str = "metachat_db", fused: bool = False):
         """
         Initialize the MetaChat framework.
         
         Args:
             db_name: Name of the TinyDB database file (without extension)
+            fused: Get the advice and the response from a single OpenAI request
+                instead of two sequential ones
         """
         self.db_name = db_name
-        self.system_prompts = [
-            {
-                "id": 1,
-                "name": "Sales Manager Advisor",
-                "message": "You are a sales manager looking at a chat between a sales assistant and an inquirer. Give advice to the sales assistant on how to better handle the conversation, close the sale, and address the customer's needs. Be specific and actionable.",
-                "model": "gpt-4o"
-            },
-            {
-                "id": 2,
-                "name": "Enhanced Sales Assistant",
-                "message": "You are a sales assistant who has received advice from your sales manager. Use this advice to improve your response to the customer. Maintain a friendly, helpful tone while implementing the suggested sales techniques.",
-                "model": "gpt-4o"
-            }
-        ]
+        self.fused = fused
+        # Copy the configured prompts so add_system_prompt doesn't modify the shared config;
+        # the interned messages are shared by every instance
+        self.system_prompts = [{**p, "message": sys.intern(p["message"])} for p in SYSTEM_PROMPTS]
+        # Index prompts by ID so lookups don't scan the list on every turn
+        self._prompts_by_id = {p["id"]: p for p in self.system_prompts}
+        # Formatted transcripts of recently processed chats, least recently used first:
+        # chat ID -> (message count, user role, assistant role, formatted chat)
+        self._chat_cache: OrderedDict[str, tuple[int, str, str, str]] = OrderedDict()
     
     async def process_chat(
         self, 
         chat_id: str, 
         user_role: str = "Inquirer", 
         assistant_role: str = "Sales Assistant"
-    ) -> Dict[str, Any]:
+    ) -> dict[str, Any]:
         """
         Process a chat through the meta-framework.
         
@@ -62,44 +114,235 @@ class MetaChat:
         Raises:
             ValueError: If chat not found or processing fails
         """
+        messages, formatted_chat = self._load_chat(chat_id, user_role, assistant_role)
+        
+        if self.fused:
+            # Get the advice and the enhanced response from a single request
+            last_user_message = self._get_last_user_message(messages)
+            manager_advice, enhanced_response = await self._fused_advice_and_response(
+                formatted_chat, 
+                last_user_message
+            )
+        else:
+            advice_task, last_user_message, enhanced_assistant_prompt = self._start_manager_advice(
+                formatted_chat, 
+                messages
+            )
+            
+            # Wait for the sales manager advice
+            manager_advice = await advice_task
+            
+            # Generate enhanced response using the advice
+            enhanced_response = await self._generate_enhanced_response(
+                formatted_chat, 
+                manager_advice, 
+                last_user_message,
+                enhanced_assistant_prompt
+            )
+        
+        # Add the enhanced response to the chat
+        add_message(self.db_name, chat_id, 'assistant', enhanced_response)
+        
+        return {
+            "response": enhanced_response,
+            "meta_insights": manager_advice,
+            "chat_id": chat_id
+        }
+    
+    async def process_chat_stream(
+        self, 
+        chat_id: str, 
+        user_role: str = "Inquirer", 
+        assistant_role: str = "Sales Assistant",
+        result: dict[str, Any] | None = None
+    ) -> AsyncIterator[str]:
+        """
+        Process a chat through the meta-framework, streaming the enhanced response.
+        
+        The sales manager advice is fetched before the first chunk is yielded. When the
+        stream ends, or is closed early, the streamed text is added to the chat and
+        `result` is filled with the same keys process_chat returns. If nothing was
+        streamed, nothing is saved and `result` is left untouched. Fused mode does not
+        stream: the whole response is generated by one request first and yielded as
+        a single chunk.
+        
+        Args:
+            chat_id: ID of the chat to process
+            user_role: Role name to use for the user
+            assistant_role: Role name to use for the assistant
+            result: Caller-owned dict to receive the response and meta-insights
+            
+        Yields:
+            Chunks of the enhanced response text
+            
+        Raises:
+            ValueError: If chat not found or processing fails
+        """
+        if self.fused:
+            fused_result = await self.process_chat(chat_id, user_role, assistant_role)
+            if result is not None:
+                result.update(fused_result)
+            yield fused_result["response"]
+            return
+        
+        messages, formatted_chat = self._load_chat(chat_id, user_role, assistant_role)
+        advice_task, last_user_message, enhanced_assistant_prompt = self._start_manager_advice(
+            formatted_chat, 
+            messages
+        )
+        
+        # Wait for the sales manager advice
+        manager_advice = await advice_task
+        
+        # Stream the enhanced response using the advice
+        request_messages = self._enhanced_response_messages(
+            formatted_chat, 
+            manager_advice, 
+            last_user_message,
+            enhanced_assistant_prompt
+        )
+        chunks = []
+        try:
+            async for chunk in openai_utils.generate_text_stream(
+                enhanced_assistant_prompt.get("model", "gpt-4o"), 
+                request_messages
+            ):
+                chunks.append(chunk)
+                yield chunk
+        finally:
+            # Add the full or partial response to the chat, even if the consumer
+            # stopped reading or the stream failed part way
+            if chunks:
+                enhanced_response = "".join(chunks)
+                add_message(self.db_name, chat_id, 'assistant', enhanced_response)
+                if result is not None:
+                    result.update({
+                        "response": enhanced_response,
+                        "meta_insights": manager_advice,
+                        "chat_id": chat_id
+                    })
+    
+    def _load_chat(
+        self, 
+        chat_id: str, 
+        user_role: str, 
+        assistant_role: str
+    ) -> tuple[list[dict[str, Any]], str]:
+        """
+        Fetch a chat and format it for the prompts.
+        
+        Args:
+            chat_id: ID of the chat to load
+            user_role: Role name to use for the user
+            assistant_role: Role name to use for the assistant
+            
+        Returns:
+            Tuple of (chat messages, formatted chat string)
+            
+        Raises:
+            ValueError: If chat not found or cannot be formatted
+        """
         # Fetch the chat messages
         messages = fetch_chat(self.db_name, chat_id)
         if not messages:
             raise ValueError(f"Chat with ID {chat_id} not found")
         
-        # Parse the chat into the formatted string
-        formatted_chat = parse_chat(self.db_name, chat_id, user_role, assistant_role)
+        # Format the chat, reusing the cached transcript when possible
+        formatted_chat = self._format_chat(chat_id, messages, user_role, assistant_role)
         if not formatted_chat:
             raise ValueError(f"Failed to parse chat with ID {chat_id}")
         
+        return messages, formatted_chat
+    
+    def _start_manager_advice(
+        self, 
+        formatted_chat: str, 
+        messages: list[dict[str, Any]]
+    ) -> tuple[asyncio.Task[str], str, dict[str, Any]]:
+        """
+        Validate the enhanced response inputs, then start the sales manager request.
+        
+        The inputs are checked before the task is created so a chat that cannot be
+        answered fails without making a billed request.
+        
+        Args:
+            formatted_chat: Formatted chat string
+            messages: All messages of the chat
+            
+        Returns:
+            Tuple of (sales manager advice task, last user message, enhanced assistant prompt)
+            
+        Raises:
+            ValueError: If there is no user message or the enhanced assistant prompt is missing
+        """
         # Get the last user message to respond to
-        last_user_message = None
+        last_user_message = self._get_last_user_message(messages)
+        
+        # Get the enhanced assistant prompt (id: 2)
+        enhanced_assistant_prompt = self._prompts_by_id.get(2)
+        if not enhanced_assistant_prompt:
+            raise ValueError("Enhanced assistant prompt not found")
+        
+        advice_task = asyncio.create_task(self._get_manager_advice(formatted_chat))
+        
+        return advice_task, last_user_message, enhanced_assistant_prompt
+    
+    @staticmethod
+    def _get_last_user_message(messages: list[dict[str, Any]]) -> str:
+        """
+        Get the last user message to respond to.
+        
+        Args:
+            messages: All messages of the chat
+            
+        Returns:
+            Content of the last user message
+            
+        Raises:
+            ValueError: If the chat has no user message
+        """
         for msg in reversed(messages):
             if msg.get('role') == 'user':
                 last_user_message = msg.get('content')
+                if last_user_message:
+                    return last_user_message
                 break
-                
-        if not last_user_message:
-            raise ValueError("No user message found in the chat")
         
-        # Get sales manager advice
-        manager_advice = await self._get_manager_advice(formatted_chat)
-        
-        # Generate enhanced response using the advice
-        enhanced_response = await self._generate_enhanced_response(
-            formatted_chat, 
-            manager_advice, 
-            last_user_message
-        )
+        raise ValueError("No user message found in the chat")
+    
+    def _format_chat(
+        self, 
+        chat_id: str, 
+        messages: list[dict[str, Any]], 
+        user_role: str, 
+        assistant_role: str
+    ) -> str:
+        """
+        Format a chat into a string, only formatting messages added since the last call.
         
-        # Add the enhanced response to the chat
-        add_message(self.db_name, chat_id, 'assistant', enhanced_response)
+        Args:
+            chat_id: ID of the chat being formatted
+            messages: All messages of the chat
+            user_role: Role name to use for the user
+            assistant_role: Role name to use for the assistant
+            
+        Returns:
+            Formatted chat string
+        """
+        cached = self._chat_cache.get(chat_id)
+        if cached and cached[0] <= len(messages) and cached[1:3] == (user_role, assistant_role):
+            formatted_chat = cached[3]
+            new_part = format_messages(messages[cached[0]:], user_role, assistant_role)
+            if new_part:
+                formatted_chat = f"{formatted_chat}{MESSAGE_SEPARATOR}{new_part}" if formatted_chat else new_part
+        else:
+            formatted_chat = format_messages(messages, user_role, assistant_role)
         
-        return {
-            "response": enhanced_response,
-            "meta_insights": manager_advice,
-            "chat_id": chat_id
-        }
+        self._chat_cache[chat_id] = (len(messages), user_role, assistant_role, formatted_chat)
+        self._chat_cache.move_to_end(chat_id)
+        if len(self._chat_cache) > _CHAT_CACHE_SIZE:
+            self._chat_cache.popitem(last=False)
+        return formatted_chat
     
     async def _get_manager_advice(self, formatted_chat: str) -> str:
         """
@@ -112,10 +355,10 @@ class MetaChat:
             Sales manager advice
         """
         # Create the prompt for the sales manager
-        prompt = f"The current conversation between the sales assistant and inquirer is as follows:\n\n{formatted_chat}\n\nProvide specific advice to help the sales assistant better handle this conversation."
+        prompt = _MANAGER_PROMPT.format(chat=formatted_chat)
         
         # Get the sales manager prompt (id: 1)
-        sales_manager_prompt = next((p for p in self.system_prompts if p.get("id") == 1), None)
+        sales_manager_prompt = self._prompts_by_id.get(1)
         if not sales_manager_prompt:
             raise ValueError("Sales manager prompt not found")
         
@@ -125,14 +368,15 @@ class MetaChat:
             {"role": "user", "content": prompt}
         ]
         
-        response = await generate_text(sales_manager_prompt.get("model", "gpt-4o"), messages)
+        response = await openai_utils.generate_text(sales_manager_prompt.get("model", "gpt-4o"), messages)
         return response.get("text", "")
     
     async def _generate_enhanced_response(
         self, 
         formatted_chat: str, 
         manager_advice: str, 
-        last_user_message: str
+        last_user_message: str,
+        enhanced_assistant_prompt: dict[str, Any]
     ) -> str:
         """
         Generate an enhanced response using the sales manager's advice.
@@ -141,37 +385,108 @@ class MetaChat:
             formatted_chat: Formatted chat string
             manager_advice: Advice from the sales manager
             last_user_message: Last message from the user
+            enhanced_assistant_prompt: System prompt for the enhanced assistant
             
         Returns:
             Enhanced assistant response
         """
+        messages = self._enhanced_response_messages(
+            formatted_chat, 
+            manager_advice, 
+            last_user_message,
+            enhanced_assistant_prompt
+        )
+        
+        response = await openai_utils.generate_text(enhanced_assistant_prompt.get("model", "gpt-4o"), messages)
+        return response.get("text", "")
+    
+    def _enhanced_response_messages(
+        self, 
+        formatted_chat: str, 
+        manager_advice: str, 
+        last_user_message: str,
+        enhanced_assistant_prompt: dict[str, Any]
+    ) -> list[dict[str, Any]]:
+        """
+        Build the messages for the enhanced response request.
+        
+        Args:
+            formatted_chat: Formatted chat string
+            manager_advice: Advice from the sales manager
+            last_user_message: Last message from the user
+            enhanced_assistant_prompt: System prompt for the enhanced assistant
+            
+        Returns:
+            Messages for the enhanced assistant completion
+        """
         # Create the prompt for the enhanced assistant
-        prompt = f"""You have received the following advice from your Sales Manager:
-
-"{manager_advice}"
-
-Here is the current chat:
-{formatted_chat}
-
-The customer's last message was:
-"{last_user_message}"
+        prompt = _ENHANCED_PROMPT.format(
+            advice=manager_advice, 
+            chat=formatted_chat, 
+            msg=last_user_message
+        )
+        
+        return [
+            {"role": "system", "content": enhanced_assistant_prompt.get("message", "")},
+            {"role": "user", "content": prompt}
+        ]
 
-Please respond to the customer's last message, applying the advice from your sales manager.
-"""
+    async def _fused_advice_and_response(
+        self, 
+        formatted_chat: str, 
+        last_user_message: str
+    ) -> tuple[str, str]:
+        """
+        Get the sales manager advice and the enhanced response from a single request.
         
-        # Get the enhanced assistant prompt (id: 2)
-        enhanced_assistant_prompt = next((p for p in self.system_prompts if p.get("id") == 2), None)
+        The sales manager and enhanced assistant prompts are combined into one system
+        prompt that asks for the advice in <advice> tags followed by the reply in
+        <response> tags, which are split apart here.
+        
+        Args:
+            formatted_chat: Formatted chat string
+            last_user_message: Last message from the user
+            
+        Returns:
+            Tuple of (sales manager advice, enhanced assistant response)
+            
+        Raises:
+            ValueError: If a prompt is missing or the completion has no customer response
+        """
+        sales_manager_prompt = self._prompts_by_id.get(1)
+        if not sales_manager_prompt:
+            raise ValueError("Sales manager prompt not found")
+        enhanced_assistant_prompt = self._prompts_by_id.get(2)
         if not enhanced_assistant_prompt:
             raise ValueError("Enhanced assistant prompt not found")
         
-        # Generate the enhanced response
+        system_message = _FUSED_SYSTEM_PROMPT.format(
+            manager=sales_manager_prompt.get("message", ""), 
+            assistant=enhanced_assistant_prompt.get("message", "")
+        )
+        prompt = _FUSED_PROMPT.format(chat=formatted_chat, msg=last_user_message)
+        
         messages = [
-            {"role": "system", "content": enhanced_assistant_prompt.get("message", "")},
+            {"role": "system", "content": system_message},
             {"role": "user", "content": prompt}
         ]
         
-        response = await generate_text(enhanced_assistant_prompt.get("model", "gpt-4o"), messages)
-        return response.get("text", "")
+        response = await openai_utils.generate_text(enhanced_assistant_prompt.get("model", "gpt-4o"), messages)
+        text = response.get("text") or ""
+        
+        advice_match = _FUSED_ADVICE_RE.search(text)
+        manager_advice = advice_match.group(1).strip() if advice_match else ""
+        
+        # Never let the advice reach the customer, even if the response tags are missing
+        remaining = _FUSED_ADVICE_RE.sub("", text)
+        response_match = _FUSED_RESPONSE_RE.search(remaining)
+        if response_match:
+            remaining = response_match.group(1)
+        enhanced_response = _FUSED_TAG_RE.sub("", remaining).strip()
+        
+        if not enhanced_response:
+            raise ValueError("Fused completion did not contain a response to the customer")
+        return manager_advice, enhanced_response
 
     def add_system_prompt(self, prompt_id: int, name: str, message: str, model: str = "gpt-4o") -> None:
         """
@@ -184,14 +499,15 @@ Please respond to the customer's last message, applying the advice from your sal
             model: OpenAI model to use with this prompt
         """
         # Check if prompt ID already exists
-        existing = next((p for p in self.system_prompts if p.get("id") == prompt_id), None)
-        if existing:
+        if prompt_id in self._prompts_by_id:
             raise ValueError(f"System prompt with ID {prompt_id} already exists")
         
         # Add the new prompt
-        self.system_prompts.append({
+        prompt = {
             "id": prompt_id,
             "name": name,
             "message": message,
             "model": model
-        })
\ No newline at end of file
+        }
+        self.system_prompts.append(prompt)
+        self._prompts_by_id[prompt_id] = prompt
\ No newline at end of file
@@ -8,23 +8,103 @@ allowing users to interact with the meta-level conversation enhancement system.
 
 import os
 import asyncio
+import hashlib
+import threading
 import streamlit as st
-from typing import List, Dict, Any, Optional
 import sys
-import time
 
 # Add the parent directory to the path
 sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-# Import MetaChat framework and utilities
-from meta_framework import MetaChat
+# Import MetaChat framework and utilities; the framework and the OpenAI SDK
+# are only loaded once a message is processed or an API key is verified
+from config import OPENAI_CONFIG
 from utils.chat_utils import begin_chat, fetch_chat, add_message, fetch_all
-from utils.openai_utils import get_client
+from utils.import_utils import lazy_import
 
-# Initialize MetaChat framework
+meta_framework = lazy_import("meta_framework")
+openai_utils = lazy_import("utils.openai_utils")
+
+# Initialize MetaChat framework (one cached instance per processing mode)
+@st.cache_resource
+def get_metachat(fused: bool = False):
+    return meta_framework.MetaChat(db_name="metachat_db", fused=fused)
+
+# Persistent event loop shared across reruns so async clients keep their connection pools
 @st.cache_resource
-def get_metachat():
-    return MetaChat(db_name="metachat_db")
+def get_loop():
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, daemon=True).start()
+    return loop
+
+# Iterate an async generator on the persistent event loop from Streamlit's thread;
+# the generator is closed on the loop even if Streamlit stops the script mid-stream
+def iterate_on_loop(async_gen):
+    loop = get_loop()
+    try:
+        while True:
+            try:
+                yield asyncio.run_coroutine_threadsafe(async_gen.__anext__(), loop).result()
+            except StopAsyncIteration:
+                break
+    finally:
+        asyncio.run_coroutine_threadsafe(async_gen.aclose(), loop).result()
+
+def render_chat_and_input(chat_id: str) -> None:
+    """Render the chat history and process a newly submitted message."""
+    st.header(f"Chat {chat_id[:8]}...")
+    
+    # Display chat messages
+    try:
+        messages = fetch_chat("metachat_db", chat_id)
+        if messages:
+            for msg in messages:
+                role = msg.get("role")
+                content = msg.get("content")
+                
+                if role == "user":
+                    st.chat_message("user", avatar="👤").markdown(content)
+                elif role == "assistant":
+                    st.chat_message("assistant", avatar="🤖").markdown(content)
+                # System messages are not displayed
+    except Exception as e:
+        st.error(f"Error fetching chat messages: {e}")
+    
+    # Input for new message
+    prompt = st.chat_input("Type your message here...")
+    if prompt:
+        # Display user message
+        st.chat_message("user", avatar="👤").markdown(prompt)
+        
+        # Add user message to the chat
+        add_message("metachat_db", chat_id, "user", prompt)
+        
+        with st.spinner("Thinking..."):
+            # Process the chat through MetaChat framework
+            try:
+                metachat = get_metachat(st.session_state.fused_mode)
+                
+                # Stream the assistant response as it is generated
+                result = {}
+                st.chat_message("assistant", avatar="🤖").write_stream(
+                    iterate_on_loop(
+                        metachat.process_chat_stream(
+                            chat_id,
+                            st.session_state.user_role,
+                            st.session_state.assistant_role,
+                            result
+                        )
+                    )
+                )
+                
+                # Store manager insights, dropping stale ones if no response was saved
+                if "meta_insights" in result:
+                    st.session_state.manager_insights[chat_id] = result["meta_insights"]
+                else:
+                    st.session_state.manager_insights.pop(chat_id, None)
+            except Exception as e:
+                st.error(f"Error processing chat: {e}")
+                st.stop()
 
 # Page configuration
 st.set_page_config(
@@ -45,8 +125,10 @@ if "user_role" not in st.session_state:
     st.session_state.user_role = "Inquirer"
 if "assistant_role" not in st.session_state:
     st.session_state.assistant_role = "Sales Assistant"
-if "api_key_verified" not in st.session_state:
-    st.session_state.api_key_verified = False
+if "verified_key_hash" not in st.session_state:
+    st.session_state.verified_key_hash = None
+if "fused_mode" not in st.session_state:
+    st.session_state.fused_mode = OPENAI_CONFIG.get("fused_advice_and_response", False)
 
 # Title and description
 st.title("MetaChat Framework")
@@ -64,13 +146,13 @@ with st.sidebar:
     # OpenAI API Key
     api_key = st.text_input("OpenAI API Key", type="password")
     if api_key:
-        os.environ["OPENAI_API_KEY"] = api_key
-        
-        # Verify API key if not already verified
-        if not st.session_state.api_key_verified:
+        # Verify API key only when it differs from the last verified one
+        key_hash = hashlib.sha1(api_key.encode()).hexdigest()
+        if key_hash != st.session_state.verified_key_hash:
+            os.environ["OPENAI_API_KEY"] = api_key
             try:
-                get_client()
-                st.session_state.api_key_verified = True
+                openai_utils.get_client(api_key)
+                st.session_state.verified_key_hash = key_hash
                 st.success("API key verified! ✅")
             except Exception as e:
                 st.error(f"Error verifying API key: {e}")
@@ -123,6 +205,18 @@ with st.sidebar:
     show_insights = st.toggle("Show Manager Insights", value=st.session_state.show_manager_insights)
     if show_insights != st.session_state.show_manager_insights:
         st.session_state.show_manager_insights = show_insights
+    
+    st.divider()
+    
+    # Toggle single-request processing
+    st.subheader("Processing Options")
+    fused_mode = st.toggle(
+        "Single-request Mode",
+        value=st.session_state.fused_mode,
+        help="Get the manager insights and the response from one OpenAI request. Responses are shown all at once instead of streamed."
+    )
+    if fused_mode != st.session_state.fused_mode:
+        st.session_state.fused_mode = fused_mode
 
 # Main chat interface
 if st.session_state.active_chat_id:
@@ -133,57 +227,7 @@ if st.session_state.active_chat_id:
         
         # Chat column
         with chat_col:
-            st.header(f"Chat {st.session_state.active_chat_id[:8]}...")
-            
-            # Display chat messages
-            try:
-                messages = fetch_chat("metachat_db", st.session_state.active_chat_id)
-                if messages:
-                    for msg in messages:
-                        role = msg.get("role")
-                        content = msg.get("content")
-                        
-                        if role == "user":
-                            st.chat_message("user", avatar="👤").markdown(content)
-                        elif role == "assistant":
-                            st.chat_message("assistant", avatar="🤖").markdown(content)
-                        # System messages are not displayed
-            except Exception as e:
-                st.error(f"Error fetching chat messages: {e}")
-            
-            # Input for new message
-            prompt = st.chat_input("Type your message here...")
-            if prompt:
-                # Display user message
-                st.chat_message("user", avatar="👤").markdown(prompt)
-                
-                # Add user message to the chat
-                add_message("metachat_db", st.session_state.active_chat_id, "user", prompt)
-                
-                with st.spinner("Thinking..."):
-                    # Process the chat through MetaChat framework
-                    try:
-                        metachat = get_metachat()
-                        
-                        # Use asyncio to call the async process_chat method
-                        loop = asyncio.new_event_loop()
-                        asyncio.set_event_loop(loop)
-                        result = loop.run_until_complete(
-                            metachat.process_chat(
-                                st.session_state.active_chat_id,
-                                st.session_state.user_role,
-                                st.session_state.assistant_role
-                            )
-                        )
-                        
-                        # Store manager insights
-                        st.session_state.manager_insights[st.session_state.active_chat_id] = result.get("meta_insights", "")
-                        
-                        # Display assistant response
-                        st.chat_message("assistant", avatar="🤖").markdown(result.get("response", ""))
-                    except Exception as e:
-                        st.error(f"Error processing chat: {e}")
-                        st.stop()
+            render_chat_and_input(st.session_state.active_chat_id)
         
         # Insights column
         with insights_col:
@@ -197,57 +241,7 @@ if st.session_state.active_chat_id:
     
     else:
         # Single column layout (no insights)
-        st.header(f"Chat {st.session_state.active_chat_id[:8]}...")
-        
-        # Display chat messages
-        try:
-            messages = fetch_chat("metachat_db", st.session_state.active_chat_id)
-            if messages:
-                for msg in messages:
-                    role = msg.get("role")
-                    content = msg.get("content")
-                    
-                    if role == "user":
-                        st.chat_message("user", avatar="👤").markdown(content)
-                    elif role == "assistant":
-                        st.chat_message("assistant", avatar="🤖").markdown(content)
-                    # System messages are not displayed
-        except Exception as e:
-            st.error(f"Error fetching chat messages: {e}")
-        
-        # Input for new message
-        prompt = st.chat_input("Type your message here...")
-        if prompt:
-            # Display user message
-            st.chat_message("user", avatar="👤").markdown(prompt)
-            
-            # Add user message to the chat
-            add_message("metachat_db", st.session_state.active_chat_id, "user", prompt)
-            
-            with st.spinner("Thinking..."):
-                # Process the chat through MetaChat framework
-                try:
-                    metachat = get_metachat()
-                    
-                    # Use asyncio to call the async process_chat method
-                    loop = asyncio.new_event_loop()
-                    asyncio.set_event_loop(loop)
-                    result = loop.run_until_complete(
-                        metachat.process_chat(
-                            st.session_state.active_chat_id,
-                            st.session_state.user_role,
-                            st.session_state.assistant_role
-                        )
-                    )
-                    
-                    # Store manager insights
-                    st.session_state.manager_insights[st.session_state.active_chat_id] = result.get("meta_insights", "")
-                    
-                    # Display assistant response
-                    st.chat_message("assistant", avatar="🤖").markdown(result.get("response", ""))
-                except Exception as e:
-                    st.error(f"Error processing chat: {e}")
-                    st.stop()
+        render_chat_and_input(st.session_state.active_chat_id)
 
 else:
     # No active chat
@@ -6,11 +6,14 @@ This module provides utility functions for managing chats with TinyDB,
 including creating, fetching, and updating chats.
 """
 
+from __future__ import annotations
+
 import uuid
-import json
-from typing import List, Dict, Any, Optional, Union
+from typing import Any
 from tinydb import TinyDB, Query
-from tinydb.operations import set
+
+# Separator placed between messages in a formatted chat string
+MESSAGE_SEPARATOR = " |\n| "
 
 
 def begin_chat(db_name: str) -> str:
@@ -42,7 +45,7 @@ def begin_chat(db_name: str) -> str:
         raise IOError(f"Could not create new chat in database {db_name}: {e}")
 
 
-def fetch_chat(db_name: str, chat_id: str) -> Optional[List[Dict[str, Any]]]:
+def fetch_chat(db_name: str, chat_id: str) -> list[dict[str, Any]] | None:
     """
     Fetch a chat by its ID.
     
@@ -68,7 +71,7 @@ def fetch_chat(db_name: str, chat_id: str) -> Optional[List[Dict[str, Any]]]:
         raise IOError(f"Could not fetch chat from database {db_name}: {e}")
 
 
-def fetch_all(db_name: str) -> List[str]:
+def fetch_all(db_name: str) -> list[str]:
     """
     Fetch all chat IDs.
     
@@ -134,7 +137,7 @@ def add_message(db_name: str, chat_id: str, role: str, message: str) -> bool:
         raise IOError(f"Could not add message to chat in database {db_name}: {e}")
 
 
-def parse_chat(db_name: str, chat_id: str, user_replacement: str, assistant_replacement: str) -> Optional[str]:
+def parse_chat(db_name: str, chat_id: str, user_replacement: str, assistant_replacement: str) -> str | None:
     """
     Parse a chat into a formatted string.
     
@@ -155,18 +158,33 @@ def parse_chat(db_name: str, chat_id: str, user_replacement: str, assistant_repl
         if not messages:
             return None
         
-        formatted_messages = []
-        for msg in messages:
-            role = msg.get('role', '')
-            content = msg.get('content', '')
-            
-            if role == 'user':
-                formatted_messages.append(f"*{user_replacement}*: {content}")
-            elif role == 'assistant':
-                formatted_messages.append(f"*{assistant_replacement}*: {content}")
-            # System messages are typically not displayed to users
-        
-        return " |\n| ".join(formatted_messages)
+        return format_messages(messages, user_replacement, assistant_replacement)
     except Exception as e:
         print(f"Error parsing chat {chat_id}: {e}")
-        raise IOError(f"Could not parse chat from database {db_name}: {e}")
\ No newline at end of file
+        raise IOError(f"Could not parse chat from database {db_name}: {e}")
+
+
+def format_messages(messages: list[dict[str, Any]], user_replacement: str, assistant_replacement: str) -> str:
+    """
+    Format a list of chat messages into a string.
+    
+    Args:
+        messages: Chat messages to format
+        user_replacement: String to replace 'user' roles in formatting
+        assistant_replacement: String to replace 'assistant' roles in formatting
+        
+    Returns:
+        Formatted chat string (empty if there are no displayable messages)
+    """
+    formatted_messages = []
+    for msg in messages:
+        role = msg.get('role', '')
+        content = msg.get('content', '')
+        
+        if role == 'user':
+            formatted_messages.append(f"*{user_replacement}*: {content}")
+        elif role == 'assistant':
+            formatted_messages.append(f"*{assistant_replacement}*: {content}")
+        # System messages are typically not displayed to users
+    
+    return MESSAGE_SEPARATOR.join(formatted_messages)
\ No newline at end of file
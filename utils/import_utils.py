@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Import Utility Functions
+
+This module provides helpers for deferring heavy imports (such as the OpenAI SDK)
+until they are first used, keeping application startup fast.
+"""
+
+import importlib
+import types
+
+
+class _LazyModule(types.ModuleType):
+    """
+    Module proxy that imports the real module on first attribute access.
+    """
+
+    def __getattr__(self, attr: str):
+        module = self.__dict__.get("_module")
+        if module is None:
+            module = importlib.import_module(self.__name__)
+            self.__dict__["_module"] = module
+        return getattr(module, attr)
+
+
+def lazy_import(module_name: str) -> types.ModuleType:
+    """
+    Return a proxy for a module that is only imported when first used.
+
+    Args:
+        module_name: Fully qualified name of the module (e.g., 'utils.openai_utils')
+
+    Returns:
+        Module proxy that forwards attribute access to the real module
+    """
+    return _LazyModule(module_name)
@@ -6,36 +6,161 @@ This module provides utility functions for interacting with the OpenAI API,
 including text generation, image generation, and custom AI responses.
 """
 
+from __future__ import annotations
+
 import os
-import json
-from typing import List, Dict, Any, Optional, Union
-from openai import OpenAI
+import re
+import asyncio
+import functools
+from collections.abc import AsyncIterator
+from typing import Any
+from openai import OpenAI, AsyncOpenAI
+
+# Prefer orjson for parsing model output when it is installed
+try:
+    import orjson
+    _json_loads = orjson.loads
+    _JSONDecodeError = orjson.JSONDecodeError
+except ImportError:
+    import json
+    _json_loads = json.loads
+    _JSONDecodeError = json.JSONDecodeError
 
-# Global client variable
+# Global client variables and the API key they were built with
 client = None
+_async_client = None
+_active_api_key = None
+
+# Markdown code fences (with an optional json language tag) around JSON output
+_FENCE_RE = re.compile(r"```[ \t]*(?:json)?", re.IGNORECASE)
 
-def get_client():
+
+@functools.lru_cache(maxsize=1)
+def _cached_api_key() -> str:
     """
-    Get or initialize the OpenAI client.
+    Read the OpenAI API key from the environment once per process.
+    
+    Raises:
+        KeyError: If OPENAI_API_KEY is not set (not cached, so a later retry re-reads it)
+    """
+    return os.environ["OPENAI_API_KEY"]
+
+
+@functools.lru_cache(maxsize=4)
+def _build_client(api_key: str) -> OpenAI:
+    """
+    Build an OpenAI client, returning the same instance for a repeated key.
+    """
+    return OpenAI(api_key=api_key)
+
+
+def _close_async_client(async_client: AsyncOpenAI, loop: asyncio.AbstractEventLoop) -> None:
+    """
+    Close a replaced async client on the event loop its connections belong to.
+    
+    A client whose loop is closed or no longer running cannot be closed gracefully;
+    it is simply dropped, which releases its connections once it is collected.
+    """
+    if loop is asyncio.get_running_loop():
+        task = loop.create_task(async_client.close())
+        _closing_tasks.add(task)
+        task.add_done_callback(_closing_tasks.discard)
+    elif loop.is_running():
+        asyncio.run_coroutine_threadsafe(async_client.close(), loop)
+
+
+def _resolve_api_key(api_key: str | None) -> str:
+    """
+    Resolve the API key to build clients with and remember it as the active key.
+    
+    Args:
+        api_key: Explicit API key, or None to use the active or environment key
     
     Returns:
-        OpenAI client instance
+        The API key to use
     
     Raises:
         ValueError: If API key is not set
     """
-    global client
+    global _active_api_key
     
-    if client is None:
-        api_key = os.getenv("OPENAI_API_KEY")
+    if api_key is None:
+        if _active_api_key is not None:
+            return _active_api_key
+        
+        try:
+            api_key = _cached_api_key()
+        except KeyError:
+            api_key = None
         if not api_key:
+            _cached_api_key.cache_clear()
             raise ValueError("OpenAI API key not set. Please set the OPENAI_API_KEY environment variable.")
-        client = OpenAI(api_key=api_key)
     
+    _active_api_key = api_key
+    return api_key
+
+
+def get_client(api_key: str | None = None):
+    """
+    Get or initialize the OpenAI client.
+    
+    Args:
+        api_key: Explicit API key to use; defaults to the OPENAI_API_KEY environment variable
+    
+    Returns:
+        OpenAI client instance
+    
+    Raises:
+        ValueError: If API key is not set
+    """
+    global client
+    
+    client = _build_client(_resolve_api_key(api_key))
     return client
 
 
-async def generate_text(model: str, messages: List[Dict[str, Any]]) -> Dict[str, Any]:
+# Event loop and API key the async client was built for; its connection pool is
+# bound to that loop, so a new client is built (and the old one closed) when either changes
+_async_client_loop = None
+_async_client_key = None
+# Close tasks for replaced async clients, referenced until they finish
+_closing_tasks = set()
+
+
+def get_async_client(api_key: str | None = None):
+    """
+    Get or initialize the async OpenAI client for the running event loop.
+    
+    The client is reused by every request on the same loop so its HTTP connection
+    pool is kept. Must be called from a coroutine.
+    
+    Args:
+        api_key: Explicit API key to use; defaults to the OPENAI_API_KEY environment variable
+    
+    Returns:
+        AsyncOpenAI client instance
+    
+    Raises:
+        ValueError: If API key is not set
+    """
+    global _async_client, _async_client_loop, _async_client_key
+    
+    api_key = _resolve_api_key(api_key)
+    loop = asyncio.get_running_loop()
+    
+    if _async_client is not None and _async_client_loop is loop and _async_client_key == api_key:
+        return _async_client
+    
+    if _async_client is not None:
+        _close_async_client(_async_client, _async_client_loop)
+    
+    _async_client = AsyncOpenAI(api_key=api_key)
+    _async_client_loop = loop
+    _async_client_key = api_key
+    return _async_client
+
+
+async def generate_text(model: str, messages: list[dict[str, Any]]) -> dict[str, Any]:
     """
     Generate text using OpenAI models.
     
@@ -55,9 +180,9 @@ async def generate_text(model: str, messages: List[Dict[str, Any]]) -> Dict[str,
             raise ValueError("No messages provided.")
         
         # Get client
-        openai_client = get_client()
+        openai_client = get_async_client()
         
-        completion = openai_client.chat.completions.create(
+        completion = await openai_client.chat.completions.create(
             model=model,
             messages=messages
         )
@@ -74,7 +199,43 @@ async def generate_text(model: str, messages: List[Dict[str, Any]]) -> Dict[str,
 
 
 
-def parse_json(content: Optional[str]) -> Optional[Dict[str, Any]]:
+async def generate_text_stream(model: str, messages: list[dict[str, Any]]) -> AsyncIterator[str]:
+    """
+    Generate text using OpenAI models, yielding it as it is produced.
+    
+    Args:
+        model: The model to use (e.g., 'gpt-4o-mini', 'gpt-3.5-turbo')
+        messages: List of message objects in the format [{"role": "...", "content": "..."}]
+        
+    Yields:
+        Chunks of generated text
+    
+    Raises:
+        ValueError: If no messages are provided
+        Exception: Any errors from the OpenAI API
+    """
+    try:
+        if not messages:
+            raise ValueError("No messages provided.")
+        
+        # Get client
+        openai_client = get_async_client()
+        
+        stream = await openai_client.chat.completions.create(
+            model=model,
+            messages=messages,
+            stream=True
+        )
+        
+        async for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                yield chunk.choices[0].delta.content
+    except Exception as error:
+        print(f"Error generating text stream: {error}")
+        raise
+
+
+def parse_json(content: str | None) -> dict[str, Any] | None:
     """
     Safely parse a JSON string.
     
@@ -88,24 +249,24 @@ def parse_json(content: Optional[str]) -> Optional[Dict[str, Any]]:
         return None
     
     try:
-        return json.loads(content)
-    except Exception:
+        return _json_loads(content)
+    except (_JSONDecodeError, ValueError):
         return None
 
 
 async def generate_json_custom_ai(
     message: str, 
     prompt_id: int, 
-    system_prompts: List[Dict[str, Any]], 
+    system_prompts: list[dict[str, Any]] | dict[int, dict[str, Any]], 
     retry_count: int = 0
-) -> Dict[str, Any]:
+) -> dict[str, Any]:
     """
     Generate a JSON response from a custom AI.
     
     Args:
         message: User message
         prompt_id: ID of the system prompt to use
-        system_prompts: List of system prompts
+        system_prompts: List of system prompts, or a dict of them keyed by ID
         retry_count: Number of retries attempted (default: 0)
         
     Returns:
@@ -117,7 +278,10 @@ async def generate_json_custom_ai(
     """
     try:
         # Find the system prompt with the specified ID
-        system_prompt = next((p for p in system_prompts if p.get("id") == prompt_id), None)
+        # Index the prompts once; retries reuse the dict
+        if not isinstance(system_prompts, dict):
+            system_prompts = {p.get("id"): p for p in system_prompts}
+        system_prompt = system_prompts.get(prompt_id)
         
         if not system_prompt:
             raise ValueError(f"System prompt with ID {prompt_id} not found")
@@ -134,7 +298,7 @@ async def generate_json_custom_ai(
         
         # Clean and parse the response
         if response.get("text"):
-            cleaned_response = response["text"].replace("```json", "").replace("```", "")
+            cleaned_response = _FENCE_RE.sub("", response["text"])
             parsed_response = parse_json(cleaned_response)
             
             if not parsed_response and retry_count < 5:
@@ -157,13 +321,35 @@ async def generate_json_custom_ai(
         raise
 
 
+def extend_messages(
+    messages: list[dict[str, Any]], 
+    new_messages: list[dict[str, Any]] | dict[str, Any]
+) -> None:
+    """
+    Add new messages to an existing messages array in place.
+    
+    Args:
+        messages: Existing chat messages (modified in place)
+        new_messages: New message or list of messages to add
+    """
+    if isinstance(new_messages, dict):
+        messages.append(new_messages)
+    elif isinstance(new_messages, list):
+        messages.extend(new_messages)
+    else:
+        raise TypeError("new_messages must be a dict or a list of dicts")
+
+
 async def add_messages(
-    messages: List[Dict[str, Any]], 
-    new_messages: Union[List[Dict[str, Any]], Dict[str, Any]]
-) -> List[Dict[str, Any]]:
+    messages: list[dict[str, Any]], 
+    new_messages: list[dict[str, Any]] | dict[str, Any]
+) -> list[dict[str, Any]]:
     """
     Add new messages to an existing messages array.
     
+    The original list is left untouched; use extend_messages to avoid the copy
+    when the caller does not need it.
+    
     Args:
         messages: Existing chat messages
         new_messages: New message or list of messages to add
@@ -171,9 +357,6 @@ async def add_messages(
     Returns:
         Updated list of messages
     """
-    if isinstance(new_messages, dict):
-        return messages + [new_messages]
-    elif isinstance(new_messages, list):
-        return messages + new_messages
-    else:
-        raise TypeError("new_messages must be a dict or a list of dicts")
\ No newline at end of file
+    updated_messages = messages.copy()
+    extend_messages(updated_messages, new_messages)
+    return updated_messages
\ No newline at end of file